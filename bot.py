@@ -8,15 +8,24 @@ import json
 import uuid
 import os
 import pandas as pd
-import pandas_ta as ta
 import numpy as np
 from datetime import datetime, timedelta
 import telegram
 from telegram.error import TelegramError
 from dotenv import load_dotenv
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import feedparser
 import asyncio
+import bisect
+import functools
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import websockets
+from collections import deque
+from compute_worker import compute_indicator_values, score_sentiment, init_worker, indicator_worker, sentiment_worker
 
 # Logging configuration (Console logging for Heroku)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,9 +40,6 @@ KUCOIN_API_PASSPHRASE = os.getenv('KUCOIN_API_PASSPHRASE')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
-# Telegram bot
-telegram_bot = telegram.Bot(token=TELEGRAM_BOT_TOKEN)
-
 # Constants
 SYMBOL = "ETHUSDTM"
 TAKE_PROFIT_PCT = 0.002  # 0.1%
@@ -43,17 +49,55 @@ MIN_BALANCE = 5  # Minimum 5 USDT
 LEVERAGE_MAX = 10  # Maximum 10x
 LEVERAGE_FALLBACK = 5  # Fallback to 5x if insufficient balance
 
+# Scheduler cadences (seconds)
+BALANCE_REFRESH_INTERVAL = 60
+LOW_BALANCE_REFRESH_INTERVAL = 300  # Flat and below MIN_BALANCE
+STOP_MONITOR_INTERVAL = 30
+STOP_MONITOR_FAST_INTERVAL = 10
+SIGNAL_CANDLE_INTERVAL = 3600  # Close of the 1h candle, the shortest timeframe in calculate_indicators
+SIGNAL_FAST_INTERVAL = 300  # Re-evaluate every 5 minutes while volatile
+CANDLE_CLOSE_DELAY = 3  # Let the exchange publish the closed candle
+VOLATILITY_WINDOW = 900  # 15 minutes of price samples
+VOLATILITY_FAST_PCT = 0.5  # High/low range (%) over the window that enables fast mode
+SCHEDULER_RECHECK = 15  # Max single sleep, so cadence changes are picked up
+API_ERROR_RETRY = 30
+UNEXPECTED_ERROR_RETRY = 10
+
+# Level-2 order book
+MAX_SLIPPAGE_PCT = 0.05  # Max expected fill distance from the best price (%), larger orders are shrunk
+ORDERBOOK_BUFFER_LIMIT = 5000  # Deltas kept while waiting for a snapshot
+ORDERBOOK_RECONNECT_DELAY = 5
+
+# Compute workers
+COMPUTE_WORKERS = int(os.getenv('COMPUTE_WORKERS', 1))  # Each worker is a full interpreter with pandas loaded
+SENTIMENT_CHUNK_SIZE = 50  # News items per worker task
+
+# Session recording / replay
+RECORD_FILE = os.getenv('RECORD_FILE')  # Record every input of this session to a JSONL tape
+REPLAY_FILE = os.getenv('REPLAY_FILE')  # Replay a recorded tape under a virtual clock instead of trading live
+ORDERBOOK_TAPE_LEVELS = 100  # Book levels stored per recorded order book read
+REPLAY_CLOCK_TOLERANCE = 15  # Max lag (s) of a replayed input behind the virtual clock before it counts as out of step
+
 # Global variables
 last_deepsearch_result = None
 last_deepsearch_time = 0
 current_price_cache = {'price': None, 'timestamp': 0}
-last_position = None  # Track last position
+_signer = None  # Shared KcSigner, see get_signer()
+_telegram_bot = None  # Shared telegram.Bot, see get_telegram_bot()
+accounts = []  # Per-account signer and state, see load_accounts()
+account_names = {}  # API key -> account name, keys the signed streams of the session tape
+compute_pool = None  # ComputeWorkerPool, started in main()
+session_tape = None  # SessionTape when recording or replaying
+virtual_clock = None  # VirtualClock when replaying
+price_history = deque()  # (timestamp, price) samples within VOLATILITY_WINDOW
 
 class KcSigner:
     def __init__(self, api_key: str, api_secret: str, api_passphrase: str):
         self.api_key = api_key
         self.api_secret = api_secret
-        self.api_passphrase = self.sign(api_passphrase.encode('utf-8'), api_secret.encode('utf-8'))
+        self._secret_key = api_secret.encode('utf-8')
+        # The signed passphrase never changes, so it is computed once per signer
+        self.api_passphrase = self.sign(api_passphrase.encode('utf-8'), self._secret_key)
 
     def sign(self, plain: bytes, key: bytes) -> str:
         hm = hmac.new(key, plain, hashlib.sha256)
@@ -61,7 +105,7 @@ class KcSigner:
 
     def headers(self, plain: str) -> dict:
         timestamp = str(int(time.time() * 1000))
-        signature = self.sign((timestamp + plain).encode('utf-8'), self.api_secret.encode('utf-8'))
+        signature = self.sign((timestamp + plain).encode('utf-8'), self._secret_key)
         return {
             "KC-API-KEY": self.api_key,
             "KC-API-PASSPHRASE": self.api_passphrase,
@@ -71,17 +115,177 @@ class KcSigner:
             "Content-Type": "application/json"
         }
 
+def get_signer():
+    global _signer
+    if _signer is None:
+        _signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
+    return _signer
+
 def safe_headers(headers):
     safe = headers.copy()
     safe["KC-API-SIGN"] = "****"
     safe["KC-API-PASSPHRASE"] = "****"
     return safe
 
+class ReplayFinished(BaseException):
+    # BaseException so the per-call `except Exception` fallbacks don't swallow the end of the tape
+    pass
+
+class VirtualClock:
+    def __init__(self, start: float):
+        self.now = start
+
+    def advance_to(self, timestamp: float):
+        self.now = max(self.now, timestamp)
+
+    async def sleep(self, delay: float):
+        # Let every task that is ready run first, so tasks sleeping side by side advance the clock once
+        wake = self.now + max(delay, 0)
+        await asyncio.sleep(0)
+        self.advance_to(wake)
+
+class SessionTape:
+    # JSONL tape of every external input (REST responses, news feeds, order book reads) in call order.
+    # Replay serves each (kind, key) stream back first-in first-out and moves the virtual clock to the
+    # time each input was recorded, so time-based branches (caches, cooldowns, polls) repeat.
+    def __init__(self, path: str, replay: bool):
+        self.path = path
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.local = threading.local()  # Capture nesting depth per thread, see capture()
+        self.out_of_step = 0  # Replayed inputs recorded well before the virtual clock
+        self.start = time.time()
+        self.streams = {}
+        self.account_names = []  # Accounts of the recorded session, replay trades them under the same names
+        self.recorded_outputs = []
+        self.outputs = []
+        if replay:
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry['kind'] == 'meta':
+                        self.start = entry['start']
+                    elif entry['kind'] == 'accounts':
+                        self.account_names = entry['names']
+                    elif entry['kind'] == 'output':
+                        self.recorded_outputs.append((entry['key'], entry['value']))
+                    else:
+                        self.streams.setdefault((entry['kind'], entry['key']), deque()).append(entry)
+            self.file = None
+            logger.info(f"Replaying {sum(len(stream) for stream in self.streams.values())} recorded inputs from {path}")
+        else:
+            # 'x' refuses an existing tape: appending would merge two sessions into one replay
+            self.file = open(path, 'x')
+            self._write({"kind": "meta", "start": self.start})
+            logger.info(f"Recording session inputs to {path}")
+
+    def _write(self, entry: dict):
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def capture(self, kind: str, key: str, fetch):
+        if self.replay:
+            stream = self.streams.get((kind, key))
+            if not stream:
+                raise ReplayFinished(f"No recorded {kind} input left for {key}")
+            entry = stream.popleft()
+            if virtual_clock.now - entry['t'] > REPLAY_CLOCK_TOLERANCE:
+                # The bot asked for this input later than it did live: the run has taken another branch
+                self.out_of_step += 1
+                logger.warning(f"Replay out of step: {kind} {key} recorded at +{entry['t'] - self.start:.0f}s, "
+                               f"read at +{virtual_clock.now - self.start:.0f}s")
+            virtual_clock.advance_to(entry['t'])
+            if 'error' in entry:
+                raise requests.exceptions.RequestException(entry['error'])
+            return entry['value']
+        if getattr(self.local, 'depth', 0):
+            # Inner input of a captured call (e.g. the ticker behind a cached price): replay never makes it
+            return fetch()
+        self.local.depth = 1
+        try:
+            value = fetch()
+        except Exception as e:
+            self._write({"t": clock_time(), "kind": kind, "key": key, "error": str(e)})
+            raise
+        finally:
+            self.local.depth = 0
+        self._write({"t": clock_time(), "kind": kind, "key": key, "value": value})
+        return value
+
+    def record_accounts(self, names: list):
+        if not self.replay:
+            self._write({"kind": "accounts", "names": names})
+
+    def record_output(self, key: str, value):
+        self.outputs.append((key, value))
+        if not self.replay:
+            self._write({"t": clock_time(), "kind": "output", "key": key, "value": value})
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def clock_time():
+    return virtual_clock.now if virtual_clock else time.time()
+
+async def clock_sleep(delay):
+    if virtual_clock:
+        await virtual_clock.sleep(delay)
+    else:
+        await asyncio.sleep(delay)
+
+async def run_blocking(func, *args):
+    # Worker thread when live; inline under replay so call order (and the tape) stays deterministic
+    if virtual_clock:
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+def capture(kind, key, fetch):
+    return session_tape.capture(kind, key, fetch) if session_tape else fetch()
+
+def http_request(method, url, headers=None, json_body=None, record=True):
+    def fetch():
+        response = requests.request(method, url, headers=headers, json=json_body, timeout=10)
+        return response.json()
+    if not record:
+        # Inputs replay never reads stay off the tape
+        return fetch()
+    key = f"{method} {url}"
+    if headers:
+        # Same URL, different account: keyed by account name, so replay needs no production credentials
+        key += f" @{account_names.get(headers['KC-API-KEY'], 'main')}"
+    return capture("http", key, fetch)
+
+def start_session_tape():
+    global session_tape, virtual_clock
+    if REPLAY_FILE:
+        session_tape = SessionTape(REPLAY_FILE, replay=True)
+        virtual_clock = VirtualClock(session_tape.start)
+    elif RECORD_FILE:
+        session_tape = SessionTape(RECORD_FILE, replay=False)
+
+def report_replay(wall_start):
+    virtual_elapsed = virtual_clock.now - session_tape.start
+    wall_elapsed = max(time.time() - wall_start, 1e-6)
+    logger.info(f"Replay finished: {virtual_elapsed:.0f}s of session in {wall_elapsed:.2f}s ({virtual_elapsed / wall_elapsed:.0f}x)")
+    if session_tape.out_of_step:
+        logger.warning(f"Replay read {session_tape.out_of_step} input(s) out of step with the recording")
+    recorded, replayed = session_tape.recorded_outputs, session_tape.outputs
+    for index, (expected, actual) in enumerate(zip(recorded, replayed)):
+        if expected != actual:
+            logger.warning(f"Replay diverged at output {index}: recorded {expected}, replayed {actual}")
+            break
+    else:
+        if len(recorded) != len(replayed):
+            logger.warning(f"Replay produced {len(replayed)} outputs, recording has {len(recorded)}")
+        else:
+            logger.info(f"Replay matched all {len(recorded)} recorded outputs")
+
 def get_klines(granularity=60, limit=200):
     try:
         url = f"https://api-futures.kucoin.com/api/v1/kline/query?symbol={SYMBOL}&granularity={granularity}&limit={limit}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        data = http_request("GET", url)
         logger.info(f"K-line response: {data}")
         if data.get('code') == '200000':
             klines = data.get('data', [])
@@ -97,23 +301,29 @@ def get_klines(granularity=60, limit=200):
         logger.error(f"K-line error: {str(e)}")
         return None
 
-def calculate_indicators():
+async def calculate_indicators():
     try:
-        indicators = {}
         timeframes = {60: "1h", 240: "4h", 1440: "1d", 10080: "1w"}
-        for granularity, tf_name in timeframes.items():
-            df = get_klines(granularity, 200)
+        frames = await asyncio.gather(*(run_blocking(get_klines, granularity, 200) for granularity in timeframes))
+        closes = {}
+        for (granularity, tf_name), df in zip(timeframes.items(), frames):
             if df is None or len(df) < 200:
                 logger.warning(f"Insufficient data for {tf_name}")
                 continue
-            df["RSI"] = ta.rsi(df["close"], length=14)
-            df["MA200"] = ta.sma(df["close"], length=200)
-            df["EMA50"] = ta.ema(df["close"], length=50)
+            closes[tf_name] = df["close"].to_numpy(dtype=np.float64)
+
+        if compute_pool:
+            values = await compute_pool.indicators(closes)
+        else:
+            values = {tf_name: compute_indicator_values(tf_closes) for tf_name, tf_closes in closes.items()}
+
+        indicators = {}
+        for tf_name, (rsi, ma200, ema50, price) in values.items():
             indicators[tf_name] = {
-                "RSI": df["RSI"].iloc[-1],
-                "MA200": df["MA200"].iloc[-1],
-                "EMA50": df["EMA50"].iloc[-1],
-                "PRICE": df["close"].iloc[-1]
+                "RSI": rsi,
+                "MA200": ma200,
+                "EMA50": ema50,
+                "PRICE": price
             }
         logger.info(f"Indicators: {indicators}")
         return indicators
@@ -151,10 +361,19 @@ def get_grok_signal(indicators, deepsearch_result):
         logger.error(f"Grok signal error: {str(e)}")
         return "wait"
 
-def run_deepsearch():
+def get_feed_entries(feed_url):
+    def fetch():
+        feed = feedparser.parse(feed_url)
+        return [
+            {"title": entry.get("title", ""), "summary": entry.get("summary", ""), "link": entry.get("link", "")}
+            for entry in feed.entries[:10]
+        ]
+    return capture("feed", feed_url, fetch)
+
+async def run_deepsearch(force=False):
     global last_deepsearch_result, last_deepsearch_time
     try:
-        if time.time() - last_deepsearch_time < DEEPSEARCH_INTERVAL:
+        if not force and clock_time() - last_deepsearch_time < DEEPSEARCH_INTERVAL:
             logger.info("DeepSearch: Using last result")
             return last_deepsearch_result
         
@@ -164,9 +383,9 @@ def run_deepsearch():
         ]
         
         crypto_news = []
-        for feed_url in feeds:
-            feed = feedparser.parse(feed_url)
-            for entry in feed.entries[:10]:
+        feed_entries = await asyncio.gather(*(run_blocking(get_feed_entries, feed_url) for feed_url in feeds))
+        for entries in feed_entries:
+            for entry in entries:
                 title = entry.get("title", "").lower()
                 summary = entry.get("summary", "").lower()
                 text = title + " " + summary
@@ -181,16 +400,19 @@ def run_deepsearch():
         
         if not crypto_news:
             logger.info("DeepSearch: No crypto news found, returning Neutral")
-            last_deepsearch_result = {"sentiment": "Neutral", "timestamp": time.time()}
-            last_deepsearch_time = time.time()
+            last_deepsearch_result = {"sentiment": "Neutral", "timestamp": clock_time()}
+            last_deepsearch_time = clock_time()
             return last_deepsearch_result
         
-        analyzer = SentimentIntensityAnalyzer()
+        texts = [f"{news['title']}: {news['summary']}" for news in crypto_news]
+        if compute_pool:
+            compound_scores = await compute_pool.sentiment(texts)
+        else:
+            compound_scores = score_sentiment(texts)
+
         sentiment_scores = []
         reg_spec_contexts = []
-        for news in crypto_news:
-            text = f"{news['title']}: {news['summary']}"
-            score = analyzer.polarity_scores(text)["compound"]
+        for news, text, score in zip(crypto_news, texts, compound_scores):
             reg_keywords = ["regulation", "sec", "law", "policy", "compliance"]
             spec_keywords = ["speculation", "rally", "crash", "bubble", "surge", "dip"]
             is_regulation = any(keyword in news["text"] for keyword in reg_keywords)
@@ -209,38 +431,110 @@ def run_deepsearch():
         if reg_spec_contexts:
             logger.info(f"DeepSearch: Regulation/Speculation contexts: {reg_spec_contexts}")
         
-        last_deepsearch_result = {"sentiment": sentiment, "timestamp": time.time()}
-        last_deepsearch_time = time.time()
+        last_deepsearch_result = {"sentiment": sentiment, "timestamp": clock_time()}
+        last_deepsearch_time = clock_time()
         return last_deepsearch_result
     
     except Exception as e:
         logger.error(f"DeepSearch error: {str(e)}")
-        return last_deepsearch_result if last_deepsearch_result else {"sentiment": "Neutral", "timestamp": time.time()}
+        return last_deepsearch_result if last_deepsearch_result else {"sentiment": "Neutral", "timestamp": clock_time()}
+
+class ComputeWorkerPool:
+    # CPU-bound indicator and sentiment math runs in worker processes so the event loop
+    # (stops, orders) never waits on it. Arrays and text batches travel through shared memory.
+    def __init__(self, workers: int = COMPUTE_WORKERS):
+        self.workers = workers
+        self.executor = self._create_executor()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker
+        )
+
+    async def _submit(self, func, *args):
+        # A dead worker breaks the whole pool: restart it and retry once, then let the error propagate
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                # Concurrent tasks share the broken pool; only the first one replaces it
+                if self.executor is executor:
+                    logger.error("Compute worker pool broken, restarting workers.")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self._create_executor()
+                if attempt:
+                    raise
 
-def check_usdm_balance():
+    async def _run_shared(self, size, fill, func, *args):
+        # fill() writes the inputs into the new block and returns a reader for the outputs
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            read = fill(shm.buf)
+            await self._submit(func, shm.name, *args)
+            return read(shm.buf)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    async def _indicators_for(self, closes):
+        length = len(closes)
+
+        def fill(buf):
+            np.ndarray((length,), dtype=np.float64, buffer=buf)[:] = closes
+            return lambda buf: tuple(np.ndarray((4,), dtype=np.float64, buffer=buf, offset=length * 8).tolist())
+
+        return await self._run_shared((length + 4) * 8, fill, indicator_worker, length)
+
+    async def indicators(self, closes_by_tf: dict) -> dict:
+        # One task per timeframe, spread across the workers
+        results = await asyncio.gather(*(self._indicators_for(closes) for closes in closes_by_tf.values()))
+        return dict(zip(closes_by_tf.keys(), results))
+
+    async def _sentiment_chunk(self, texts):
+        payload = json.dumps(texts).encode('utf-8')
+        count = len(texts)
+        offset = count * 8
+
+        def fill(buf):
+            buf[offset:offset + len(payload)] = payload
+            return lambda buf: np.ndarray((count,), dtype=np.float64, buffer=buf).tolist()
+
+        return await self._run_shared(offset + len(payload), fill, sentiment_worker, count, len(payload))
+
+    async def sentiment(self, texts: list) -> list:
+        chunks = [texts[i:i + SENTIMENT_CHUNK_SIZE] for i in range(0, len(texts), SENTIMENT_CHUNK_SIZE)]
+        results = await asyncio.gather(*(self._sentiment_chunk(chunk) for chunk in chunks))
+        return [score for chunk in results for score in chunk]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def check_usdm_balance(signer=None):
     try:
-        signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
+        signer = signer or get_signer()
         url = "https://api-futures.kucoin.com/api/v1/account-overview?currency=USDT"
         payload = "GET/api/v1/account-overview?currency=USDT"
         headers = signer.headers(payload)
-        response = requests.get(url, headers=headers, timeout=10)
-        data = response.json()
+        data = http_request("GET", url, headers)
         logger.info(f"Balance response: {data}")
         if data.get('code') == '200000':
             usdt_balance = float(data.get('data', {}).get('availableBalance', 0))
             position_margin = float(data.get('data', {}).get('positionMargin', 0))
             return usdt_balance, position_margin
         logger.error(f"USD-M balance check failed: {data.get('msg', 'Unknown error')}")
-        return 0, 0
+        return None, None
     except Exception as e:
         logger.error(f"Balance error: {str(e)}")
-        return 0, 0
+        return None, None
 
 def get_contract_details():
     try:
         url = "https://api-futures.kucoin.com/api/v1/contracts/active"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        data = http_request("GET", url)
         logger.info(f"Contract response: {data}")
         if data.get('code') == '200000':
             for contract in data.get('data', []):
@@ -259,14 +553,13 @@ def get_contract_details():
         logger.error(f"Contract details error: {str(e)}")
         return {"multiplier": 0.001, "min_order_size": 1, "max_leverage": 20, "tick_size": 0.01}
 
-def check_positions():
+def check_positions(signer=None):
     try:
-        signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
+        signer = signer or get_signer()
         url = f"https://api-futures.kucoin.com/api/v1/positions?symbol={SYMBOL}"
         payload = f"GET/api/v1/positions?symbol={SYMBOL}"
         headers = signer.headers(payload)
-        response = requests.get(url, headers=headers, timeout=10)
-        data = response.json()
+        data = http_request("GET", url, headers)
         logger.info(f"Position response: {data}")
         if data.get('code') == '200000':
             positions = data.get('data', [])
@@ -281,16 +574,15 @@ def check_positions():
                 })
             return result
         logger.error(f"Position check failed: {data.get('msg', 'Unknown error')}")
-        return []
+        return None
     except Exception as e:
         logger.error(f"Position check error: {str(e)}")
-        return []
+        return None
 
 def get_eth_price():
     try:
         url = f"https://api-futures.kucoin.com/api/v1/ticker?symbol={SYMBOL}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        data = http_request("GET", url)
         logger.info(f"Price response: {data}")
         if data.get('code') == '200000':
             price = float(data.get('data', {}).get('price', 0))
@@ -301,9 +593,25 @@ def get_eth_price():
         logger.error(f"Price fetch error: {str(e)}")
         return None
 
-async def send_telegram_message(message):
+def account_label(account):
+    return f"[{account['name']}] " if account and len(accounts) > 1 else ""
+
+def get_telegram_bot():
+    # Created on first use, so importing this module (as spawned workers do under `python bot.py`) builds no client
+    global _telegram_bot
+    if _telegram_bot is None:
+        _telegram_bot = telegram.Bot(token=TELEGRAM_BOT_TOKEN)
+    return _telegram_bot
+
+async def send_telegram_message(message, account=None):
+    text = account_label(account) + message
+    if session_tape:
+        session_tape.record_output("telegram", text)
+    if virtual_clock:
+        logger.info(f"Replay Telegram message: {text}")
+        return
     try:
-        await telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
+        await get_telegram_bot().send_message(chat_id=TELEGRAM_CHAT_ID, text=text)
         logger.info("Telegram notification sent")
     except TelegramError as e:
         logger.error(f"Telegram error: {str(e)}")
@@ -311,8 +619,7 @@ async def send_telegram_message(message):
 def get_funding_rate():
     try:
         url = f"https://api-futures.kucoin.com/api/v1/funding-rate/{SYMBOL}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        data = http_request("GET", url)
         logger.info(f"Funding rate response: {data}")
         if data.get('code') == '200000':
             return float(data.get('data', {}).get('fundingRate', 0))
@@ -322,14 +629,13 @@ def get_funding_rate():
         logger.error(f"Funding rate error: {str(e)}")
         return None
 
-def check_fills():
+def check_fills(signer=None):
     try:
-        signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
+        signer = signer or get_signer()
         url = f"https://api-futures.kucoin.com/api/v1/fills?symbol={SYMBOL}"
         payload = f"GET/api/v1/fills?symbol={SYMBOL}"
         headers = signer.headers(payload)
-        response = requests.get(url, headers=headers, timeout=10)
-        data = response.json()
+        data = http_request("GET", url, headers)
         logger.info(f"Fills response: {data}")
         if data.get('code') == '200000':
             fills = data.get('data', {}).get('items', [])
@@ -346,27 +652,286 @@ def check_fills():
         logger.error(f"Fills check error: {str(e)}")
         return []
 
+def get_stop_orders(signer=None):
+    try:
+        signer = signer or get_signer()
+        url = f"https://api-futures.kucoin.com/api/v1/stopOrders?symbol={SYMBOL}"
+        payload = f"GET/api/v1/stopOrders?symbol={SYMBOL}"
+        headers = signer.headers(payload)
+        data = http_request("GET", url, headers)
+        logger.info(f"Stop orders response: {data}")
+        if data.get('code') == '200000':
+            return data.get('data', {}).get('items', [])
+        logger.error(f"Failed to get stop orders: {data.get('msg', 'Unknown error')}")
+        return None
+    except Exception as e:
+        logger.error(f"Stop orders error: {str(e)}")
+        return None
+
 def get_cached_price():
-    now = time.time()
-    if now - current_price_cache['timestamp'] < 5:
-        return current_price_cache['price']
-    
-    price = get_eth_price()
-    if price:
-        current_price_cache.update({'price': price, 'timestamp': now})
-    return price
+    def fetch():
+        now = clock_time()
+        if now - current_price_cache['timestamp'] < 5:
+            return current_price_cache['price']
+
+        price = get_eth_price()
+        if price:
+            current_price_cache.update({'price': price, 'timestamp': now})
+        return price
+    # Whether the cache hits depends on timing, so the tape records the price rather than the ticker call
+    return capture("price", SYMBOL, fetch)
+
+async def reconcile_account(account=None):
+    signer = account['signer'] if account else get_signer()
+    # Fetch everything the loop needs in parallel; the tick costs as much as the slowest call
+    (usdt_balance, position_margin), positions, stop_orders, price = await asyncio.gather(
+        run_blocking(check_usdm_balance, signer),
+        run_blocking(check_positions, signer),
+        run_blocking(get_stop_orders, signer),
+        run_blocking(get_cached_price)
+    )
+    snapshot = {
+        # A failed leg comes back as None; an incomplete snapshot must not look like an empty account
+        "ok": usdt_balance is not None and positions is not None and stop_orders is not None,
+        "usdt_balance": usdt_balance,
+        "position_margin": position_margin,
+        "positions": positions,
+        "stop_orders": stop_orders,
+        "price": price,
+        "timestamp": clock_time()
+    }
+    logger.info(f"{account_label(account)}Account snapshot: ok={snapshot['ok']}, balance={usdt_balance} USDT, "
+                f"positions={positions}, stop_orders={None if stop_orders is None else len(stop_orders)}, price={price}")
+    return snapshot
+
+class PriceLevels:
+    # One side of the book: price -> size dict plus a bisect-maintained sorted price list,
+    # so a delta is a dict write plus (only for new/removed levels) one list insert/delete
+    def __init__(self, descending=False):
+        self.descending = descending
+        self.sizes = {}
+        self.prices = []  # Ascending
+
+    def clear(self):
+        self.sizes.clear()
+        self.prices.clear()
+
+    def update(self, price: float, size: float):
+        if size <= 0:
+            if self.sizes.pop(price, None) is not None:
+                del self.prices[bisect.bisect_left(self.prices, price)]
+            return
+        if price not in self.sizes:
+            bisect.insort(self.prices, price)
+        self.sizes[price] = size
+
+    def best(self):
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.descending else self.prices[0]
+
+    def levels(self):
+        # Best price first
+        prices = reversed(self.prices) if self.descending else self.prices
+        for price in prices:
+            yield price, self.sizes[price]
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = PriceLevels(descending=True)
+        self.asks = PriceLevels()
+        self.sequence = None
+        self.synced = False
+        self.buffer = deque(maxlen=ORDERBOOK_BUFFER_LIMIT)  # Deltas received while waiting for a snapshot, oldest dropped first
+
+    def load_snapshot(self, snapshot: dict) -> bool:
+        self.bids.clear()
+        self.asks.clear()
+        for price, size in snapshot.get('bids', []):
+            self.bids.update(float(price), float(size))
+        for price, size in snapshot.get('asks', []):
+            self.asks.update(float(price), float(size))
+        self.sequence = int(snapshot['sequence'])
+        self.synced = True
+        buffered = list(self.buffer)
+        self.buffer.clear()
+        for sequence, change in buffered:
+            if sequence > self.sequence and not self.on_delta(sequence, change):
+                break
+        logger.info(f"Order book {self.symbol} snapshot loaded, sequence: {self.sequence}, synced: {self.synced}")
+        return self.synced
+
+    def on_delta(self, sequence: int, change: str) -> bool:
+        if not self.synced:
+            self.buffer.append((sequence, change))
+            return False
+        if sequence <= self.sequence:
+            return True  # Already contained in the snapshot
+        if sequence != self.sequence + 1:
+            logger.warning(f"Order book {self.symbol} sequence gap: expected {self.sequence + 1}, got {sequence}, resyncing")
+            self.synced = False
+            self.buffer.clear()
+            self.buffer.append((sequence, change))
+            return False
+        price, side, size = change.split(',')
+        levels = self.bids if side == 'buy' else self.asks
+        levels.update(float(price), float(size))
+        self.sequence = sequence
+        return True
+
+    def to_snapshot(self, depth: int) -> dict:
+        return {
+            "sequence": self.sequence,
+            "bids": [[price, size] for price, size in itertools.islice(self.bids.levels(), depth)],
+            "asks": [[price, size] for price, size in itertools.islice(self.asks.levels(), depth)]
+        }
+
+    def estimate_fill(self, side: str, size: float, offset: float = 0) -> dict:
+        # A buy walks the asks, a sell walks the bids. The first `offset` contracts of depth are
+        # left to orders sent alongside this one; slippage is still measured from the best price.
+        levels = self.asks if side == 'buy' else self.bids
+        remaining = size
+        skip = offset
+        cost = 0
+        worst_price = None
+        for price, level_size in levels.levels():
+            if skip >= level_size:
+                skip -= level_size
+                continue
+            level_size -= skip
+            skip = 0
+            take = min(remaining, level_size)
+            cost += take * price
+            remaining -= take
+            worst_price = price
+            if remaining <= 0:
+                break
+        filled = size - remaining
+        if filled <= 0:
+            return {"avg_price": None, "worst_price": None, "slippage_pct": None, "filled": 0, "complete": False}
+        avg_price = cost / filled
+        best_price = levels.best()
+        slippage_pct = abs(avg_price - best_price) / best_price * 100
+        return {
+            "avg_price": avg_price,
+            "worst_price": worst_price,
+            "slippage_pct": slippage_pct,
+            "filled": filled,
+            "complete": remaining <= 0
+        }
+
+    def max_size_within_slippage(self, side: str, max_size: int, max_slippage_pct: float, offset: float = 0) -> int:
+        # Expected slippage only grows with size, so binary search the largest acceptable size
+        low, high = 0, max_size
+        while low < high:
+            size = (low + high + 1) // 2
+            estimate = self.estimate_fill(side, size, offset)
+            if estimate['complete'] and estimate['slippage_pct'] <= max_slippage_pct:
+                low = size
+            else:
+                high = size - 1
+        return low
+
+order_book = OrderBook(SYMBOL)  # Kept in sync by run_orderbook_feed()
+orderbook_task = None
+
+def get_level2_snapshot(record=True):
+    try:
+        url = f"https://api-futures.kucoin.com/api/v1/level2/snapshot?symbol={SYMBOL}"
+        data = http_request("GET", url, record=record)
+        if data.get('code') == '200000':
+            return data.get('data', {})
+        logger.error(f"Failed to get level2 snapshot: {data.get('msg', 'Unknown error')}")
+        return None
+    except Exception as e:
+        logger.error(f"Level2 snapshot error: {str(e)}")
+        return None
+
+def get_public_ws_endpoint():
+    try:
+        url = "https://api-futures.kucoin.com/api/v1/bullet-public"
+        response = requests.post(url, timeout=10)
+        data = response.json()
+        if data.get('code') == '200000':
+            token = data['data']['token']
+            server = data['data']['instanceServers'][0]
+            return f"{server['endpoint']}?token={token}&connectId={uuid.uuid4()}", server.get('pingInterval', 18000) / 1000
+        logger.error(f"Failed to get websocket token: {data.get('msg', 'Unknown error')}")
+        return None, None
+    except Exception as e:
+        logger.error(f"Websocket token error: {str(e)}")
+        return None, None
+
+async def ping_websocket(ws, interval):
+    while True:
+        await asyncio.sleep(interval)
+        await ws.send(json.dumps({"id": str(uuid.uuid4()), "type": "ping"}))
+
+async def run_orderbook_feed():
+    while True:
+        try:
+            endpoint, ping_interval = await asyncio.to_thread(get_public_ws_endpoint)
+            if not endpoint:
+                await asyncio.sleep(ORDERBOOK_RECONNECT_DELAY)
+                continue
+            async with websockets.connect(endpoint) as ws:
+                await ws.send(json.dumps({
+                    "id": str(uuid.uuid4()),
+                    "type": "subscribe",
+                    "topic": f"/contractMarket/level2:{SYMBOL}",
+                    "response": True
+                }))
+                ping_task = asyncio.create_task(ping_websocket(ws, ping_interval))
+                snapshot_task = None
+                try:
+                    async for raw in ws:
+                        message = json.loads(raw)
+                        if message.get('type') == 'message' and message.get('subject') == 'level2':
+                            data = message['data']
+                            order_book.on_delta(int(data['sequence']), data['change'])
+                        # Deltas are buffered until a snapshot newer than the first of them arrives
+                        if snapshot_task and snapshot_task.done():
+                            snapshot = snapshot_task.result()
+                            snapshot_task = None
+                            if snapshot:
+                                order_book.load_snapshot(snapshot)
+                        if not order_book.synced and snapshot_task is None:
+                            # Replay reads the book from get_order_book(), so resync snapshots are not recorded
+                            snapshot_task = asyncio.create_task(asyncio.to_thread(get_level2_snapshot, False))
+                finally:
+                    ping_task.cancel()
+            logger.warning("Order book websocket closed, reconnecting.")
+        except Exception as e:
+            logger.error(f"Order book feed error: {str(e)}")
+        order_book.synced = False
+        order_book.buffer.clear()
+        await asyncio.sleep(ORDERBOOK_RECONNECT_DELAY)
+
+async def get_order_book():
+    # Live local book when synced, otherwise a one-off REST snapshot
+    if order_book.synced:
+        if session_tape is None:
+            return order_book
+        snapshot = capture("orderbook", SYMBOL, lambda: order_book.to_snapshot(ORDERBOOK_TAPE_LEVELS))
+    else:
+        snapshot = await run_blocking(capture, "orderbook", SYMBOL, get_level2_snapshot)
+    if not snapshot:
+        return None
+    book = OrderBook(SYMBOL)
+    book.load_snapshot(snapshot)
+    return book
 
 def round_to_tick_size(price: float, tick_size: float) -> float:
     return round(price / tick_size) * tick_size
 
-def check_order_status(order_id: str) -> bool:
+def check_order_status(order_id: str, signer=None) -> bool:
     try:
-        signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
+        signer = signer or get_signer()
         url = f"https://api-futures.kucoin.com/api/v1/orders/{order_id}"
         payload = f"GET/api/v1/orders/{order_id}"
         headers = signer.headers(payload)
-        response = requests.get(url, headers=headers, timeout=10)
-        data = response.json()
+        data = http_request("GET", url, headers)
         logger.info(f"Order status response: {data}")
         if data.get('code') == '200000':
             status = data.get('data', {}).get('status')
@@ -385,17 +950,16 @@ def check_order_status(order_id: str) -> bool:
         logger.error(f"Order status check error: {str(e)}")
         return False
 
-async def verify_tp_order(order_id: str) -> bool:
+async def verify_tp_order(order_id: str, signer=None) -> bool:
     try:
-        signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
+        signer = signer or get_signer()
         url = f"https://api-futures.kucoin.com/api/v1/st-orders?orderId={order_id}"
         payload = f"GET/api/v1/st-orders?orderId={order_id}"
         headers = signer.headers(payload)
         
         max_retries = 3
         for attempt in range(max_retries):
-            response = requests.get(url, headers=headers, timeout=10)
-            data = response.json()
+            data = await run_blocking(http_request, "GET", url, headers)
             logger.info(f"TP verification response (attempt {attempt + 1}): {data}")
             
             if data.get('code') == '200000':
@@ -413,7 +977,7 @@ async def verify_tp_order(order_id: str) -> bool:
             else:
                 logger.error(f"TP verification error: {data.get('msg', 'Unknown error')}")
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
+                    await clock_sleep(2)
         
         logger.error(f"TP verification failed after {max_retries} attempts: {order_id}")
         return False
@@ -421,11 +985,12 @@ async def verify_tp_order(order_id: str) -> bool:
         logger.error(f"TP verification general error: {str(e)}")
         return False
 
-async def close_position_with_retry(position):
+async def close_position_with_retry(position, account=None):
     try:
+        signer = account['signer'] if account else get_signer()
         side = position['side']
         size = abs(position.get('currentQty', 0))
-        current_price = get_cached_price()
+        current_price = await run_blocking(get_cached_price)
         if not current_price:
             logger.warning("Price not available, won't attempt to close.")
             return False
@@ -445,23 +1010,20 @@ async def close_position_with_retry(position):
         retry_delay = 2
         for attempt in range(max_retries):
             try:
-                signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
                 url = "https://api-futures.kucoin.com/api/v1/orders"
                 payload = f"POST/api/v1/orders{json.dumps(close_order_data)}"
                 headers = signer.headers(payload)
-                response = requests.post(url, headers=headers, json=close_order_data, timeout=10)
-                data = response.json()
+                data = await run_blocking(http_request, "POST", url, headers, close_order_data)
 
                 if data.get('code') == '200000':
                     close_order_id = data.get('data', {}).get('orderId')
-                    logger.info(f"Position closed with 2% loss, Order ID: {close_order_id}")
+                    logger.info(f"{account_label(account)}Position closed with 2% loss, Order ID: {close_order_id}")
                     
                     # Cancel open orders (v3/orders)
                     cancel_url = f"https://api-futures.kucoin.com/api/v3/orders?symbol={SYMBOL}"
                     cancel_payload = f"DELETE/api/v3/orders?symbol={SYMBOL}"
                     cancel_headers = signer.headers(cancel_payload)
-                    cancel_response = requests.delete(cancel_url, headers=cancel_headers, timeout=10)
-                    cancel_data = cancel_response.json()
+                    cancel_data = await run_blocking(http_request, "DELETE", cancel_url, cancel_headers)
                     if cancel_data.get('code') == '200000':
                         cancelled_ids = cancel_data.get('data', {}).get('cancelledOrderIds', [])
                         logger.info(f"Open orders canceled: {cancelled_ids}")
@@ -475,29 +1037,112 @@ async def close_position_with_retry(position):
                         f"Entry: {position['entry_price']:.2f} USDT\n"
                         f"Exit: {current_price:.2f} USDT\n"
                         f"Size: {size} contracts\n"
-                        f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                        f"Date: {datetime.fromtimestamp(clock_time()).strftime('%Y-%m-%d %H:%M')}",
+                        account=account
                     )
                     return True
                 else:
-                    logger.error(f"Failed to close position (attempt {attempt + 1}): {data.get('msg', 'Unknown error')}")
+                    logger.error(f"{account_label(account)}Failed to close position (attempt {attempt + 1}): {data.get('msg', 'Unknown error')}")
                     if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay)
+                        await clock_sleep(retry_delay)
             except Exception as e:
-                logger.error(f"Position close error (attempt {attempt + 1}): {str(e)}")
+                logger.error(f"{account_label(account)}Position close error (attempt {attempt + 1}): {str(e)}")
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
+                    await clock_sleep(retry_delay)
         
-        logger.error(f"Failed to close position after {max_retries} attempts.")
-        await send_telegram_message(f"❌ Failed to close position: Error after {max_retries} attempts.")
+        logger.error(f"{account_label(account)}Failed to close position after {max_retries} attempts.")
+        await send_telegram_message(f"❌ Failed to close position: Error after {max_retries} attempts.", account=account)
         return False
     except Exception as e:
-        logger.error(f"Position close general error: {str(e)}")
+        logger.error(f"{account_label(account)}Position close general error: {str(e)}")
         return False
 
-async def open_position(signal, usdt_balance):
+def plan_position(signal, usdt_balance, contract, eth_price, book, depth_used=0, label=""):
+    # Leverage, size and expected fill of one account's market order. depth_used is the book depth
+    # taken by orders sent alongside it, see plan_positions().
+    multiplier = contract.get('multiplier', 0.001)
+    min_order_size = contract.get('min_order_size', 1)
+    max_leverage = contract.get('max_leverage', 20)
+
+    # Leverage calculation
+    leverage = str(LEVERAGE_MAX) if max_leverage >= LEVERAGE_MAX else str(max_leverage)
+    total_value = usdt_balance * int(leverage)
+    size = max(min_order_size, int(total_value / (eth_price * multiplier)))
+    position_value = size * eth_price * multiplier
+    required_margin = position_value / int(leverage)
+    logger.info(f"{leverage}x Leverage: {size} contracts, Total Value: {position_value:.2f} USDT, Required Margin: {required_margin:.2f} USDT")
+    
+    if required_margin > usdt_balance:
+        logger.warning(f"Insufficient balance for {leverage}x: Required {required_margin:.2f} USDT, available {usdt_balance:.2f} USDT")
+        leverage = str(LEVERAGE_FALLBACK) if max_leverage >= LEVERAGE_FALLBACK else str(max_leverage)
+        total_value = usdt_balance * int(leverage)
+        size = max(min_order_size, int(total_value / (eth_price * multiplier) / 2))
+        position_value = size * eth_price * multiplier
+        required_margin = position_value / int(leverage)
+        logger.info(f"{leverage}x Leverage: {size} contracts, Total Value: {position_value:.2f} USDT, Required Margin: {required_margin:.2f} USDT")
+    
+    if required_margin > usdt_balance:
+        logger.error(f"{label}Insufficient balance: Required {required_margin:.2f} USDT, available {usdt_balance:.2f} USDT")
+        return {"success": False, "error": f"Insufficient balance: {required_margin:.2f} USDT required"}
+
+    # Depth-aware sizing: a market order fills across book levels, not at the last trade price
+    expected_price = eth_price
+    if book:
+        max_size = book.max_size_within_slippage(signal, size, MAX_SLIPPAGE_PCT, depth_used)
+        if max_size < min_order_size:
+            logger.error(f"{label}Order book too thin: {min_order_size} contracts exceed {MAX_SLIPPAGE_PCT}% slippage")
+            return {"success": False, "error": "Slippage above limit"}
+        if max_size < size:
+            logger.warning(f"{label}Reducing size from {size} to {max_size} contracts to stay within {MAX_SLIPPAGE_PCT}% slippage")
+            size = max_size
+        estimate = book.estimate_fill(signal, size, depth_used)
+        expected_price = estimate['avg_price']
+        position_value = size * expected_price * multiplier
+        required_margin = position_value / int(leverage)
+        logger.info(f"{label}Expected fill: {expected_price:.2f} USDT (worst {estimate['worst_price']:.2f}, slippage {estimate['slippage_pct']:.4f}%), "
+                    f"Total Value: {position_value:.2f} USDT, Required Margin: {required_margin:.2f} USDT")
+        # A buy fills above the last price, so the margin can outgrow the balance checked above
+        if required_margin > usdt_balance:
+            affordable_size = int(usdt_balance * int(leverage) / (expected_price * multiplier))
+            if affordable_size < min_order_size:
+                logger.error(f"{label}Insufficient balance at expected fill: Required {required_margin:.2f} USDT, available {usdt_balance:.2f} USDT")
+                return {"success": False, "error": f"Insufficient balance: {required_margin:.2f} USDT required"}
+            logger.warning(f"{label}Reducing size from {size} to {affordable_size} contracts to fit the balance at the expected fill")
+            size = affordable_size
+            estimate = book.estimate_fill(signal, size, depth_used)
+            expected_price = estimate['avg_price']
+            position_value = size * expected_price * multiplier
+            required_margin = position_value / int(leverage)
+    else:
+        logger.warning(f"{label}Order book unavailable, sizing from last price.")
+
+    return {"success": True, "price": eth_price, "leverage": leverage, "size": size, "expected_price": expected_price}
+
+async def plan_positions(signal, targets):
+    # One book for the whole fan-out: each account is sized past the depth the accounts before it take,
+    # so the concurrent market orders together stay within MAX_SLIPPAGE_PCT
+    contract = await run_blocking(get_contract_details)
+    eth_price = await run_blocking(get_eth_price)
+    if not eth_price:
+        logger.error("Failed to get price, cannot open positions.")
+        return None
+    logger.info(f"Current Price: {eth_price:.2f} USDT, Symbol: {SYMBOL}")
+    book = await get_order_book()
+    plans = []
+    depth_used = 0
+    for account in targets:
+        plan = plan_position(signal, account['snapshot']['usdt_balance'], contract, eth_price, book, depth_used, account_label(account))
+        if plan['success']:
+            depth_used += plan['size']
+        plans.append(plan)
+    return plans
+
+async def open_position(signal, usdt_balance, account=None, plan=None):
     try:
+        signer = account['signer'] if account else get_signer()
+        label = account_label(account)
         # Funding rate (optional)
-        funding_rate = get_funding_rate()
+        funding_rate = await run_blocking(get_funding_rate)
         if funding_rate is None:
             logger.warning("Failed to get funding rate, continuing.")
         
@@ -507,44 +1152,27 @@ async def open_position(signal, usdt_balance):
             return {"success": False, "error": "Insufficient balance"}
         
         # Contract details
-        contract = get_contract_details()
+        contract = await run_blocking(get_contract_details)
         multiplier = contract.get('multiplier', 0.001)
         min_order_size = contract.get('min_order_size', 1)
         max_leverage = contract.get('max_leverage', 20)
         tick_size = contract.get('tick_size', 0.01)
         logger.info(f"Contract details: tick_size={tick_size}, multiplier={multiplier}, min_order_size={min_order_size}, max_leverage={max_leverage}")
         
-        # Get price
-        eth_price = get_eth_price()
-        if not eth_price:
-            logger.error("Failed to get price, cannot open position.")
-            return {"success": False, "error": "Failed to get price"}
-        logger.info(f"Current Price: {eth_price:.2f} USDT, Symbol: {SYMBOL}")
-        
-        # Leverage calculation
-        usdt_amount = usdt_balance
-        leverage = str(LEVERAGE_MAX) if max_leverage >= LEVERAGE_MAX else str(max_leverage)
-        total_value = usdt_amount * int(leverage)
-        size = max(min_order_size, int(total_value / (eth_price * multiplier)))
-        position_value = size * eth_price * multiplier
-        required_margin = position_value / int(leverage)
-        logger.info(f"{leverage}x Leverage: {size} contracts, Total Value: {position_value:.2f} USDT, Required Margin: {required_margin:.2f} USDT")
-        
-        if required_margin > usdt_balance:
-            logger.warning(f"Insufficient balance for {leverage}x: Required {required_margin:.2f} USDT, available {usdt_balance:.2f} USDT")
-            leverage = str(LEVERAGE_FALLBACK) if max_leverage >= LEVERAGE_FALLBACK else str(max_leverage)
-            total_value = usdt_amount * int(leverage)
-            size = max(min_order_size, int(total_value / (eth_price * multiplier) / 2))
-            position_value = size * eth_price * multiplier
-            required_margin = position_value / int(leverage)
-            logger.info(f"{leverage}x Leverage: {size} contracts, Total Value: {position_value:.2f} USDT, Required Margin: {required_margin:.2f} USDT")
-        
-        if required_margin > usdt_balance:
-            logger.error(f"Insufficient balance: Required {required_margin:.2f} USDT, available {usdt_balance:.2f} USDT")
-            return {"success": False, "error": f"Insufficient balance: {required_margin:.2f} USDT required"}
-        
-        # Take-profit price
-        take_profit_price = eth_price * (1 + TAKE_PROFIT_PCT) if signal == "buy" else eth_price * (1 - TAKE_PROFIT_PCT)
+        if plan is None:
+            eth_price = await run_blocking(get_eth_price)
+            if not eth_price:
+                logger.error("Failed to get price, cannot open position.")
+                return {"success": False, "error": "Failed to get price"}
+            logger.info(f"Current Price: {eth_price:.2f} USDT, Symbol: {SYMBOL}")
+            plan = plan_position(signal, usdt_balance, contract, eth_price, await get_order_book(), label=label)
+        if not plan['success']:
+            return plan
+        eth_price, leverage, size, expected_price = plan['price'], plan['leverage'], plan['size'], plan['expected_price']
+        position_value = size * expected_price * multiplier
+
+        # Take-profit price (re-based on the actual entry once filled)
+        take_profit_price = expected_price * (1 + TAKE_PROFIT_PCT) if signal == "buy" else expected_price * (1 - TAKE_PROFIT_PCT)
         take_profit_price = round_to_tick_size(take_profit_price, tick_size)
         logger.info(f"Take Profit Price: {take_profit_price:.2f} (tick_size={tick_size})")
         
@@ -566,48 +1194,52 @@ async def open_position(signal, usdt_balance):
         
         url = "https://api-futures.kucoin.com/api/v1/orders"
         payload = f"POST/api/v1/orders{json.dumps(order_data)}"
-        signer = KcSigner(KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE)
         headers = signer.headers(payload)
         logger.info(f"Headers: {safe_headers(headers)}")
-        logger.info(f"Order data: {order_data}")
-        response = requests.post(url, headers=headers, json=order_data, timeout=10)
-        data = response.json()
-        logger.info(f"Open position response: {data}")
+        logger.info(f"{label}Order data: {order_data}")
+        data = await run_blocking(http_request, "POST", url, headers, order_data)
+        logger.info(f"{label}Open position response: {data}")
         
         if data.get('code') != '200000':
-            logger.error(f"Failed to open position: {data.get('msg', 'Unknown error')}")
+            logger.error(f"{label}Failed to open position: {data.get('msg', 'Unknown error')}")
             return {"success": False, "error": data.get('msg', 'Unknown error')}
         
         order_id = data.get('data', {}).get('orderId')
-        logger.info(f"Position open order sent! Order ID: {order_id}")
+        logger.info(f"{label}Position open order sent! Order ID: {order_id}")
 
         # Wait for order to fill
         max_wait_time = 30
         check_interval = 2
-        start_time = time.time()
-        while time.time() - start_time < max_wait_time:
-            if check_order_status(order_id):
+        start_time = clock_time()
+        while clock_time() - start_time < max_wait_time:
+            if await run_blocking(check_order_status, order_id, signer):
                 logger.info(f"Position opened, sending TP order.")
                 break
             logger.info(f"Order {order_id} not yet filled, waiting...")
-            time.sleep(check_interval)
+            await clock_sleep(check_interval)
         else:
             logger.error(f"Order {order_id} not filled within {max_wait_time}s.")
-            await send_telegram_message(f"⚠️ Error: Position order {order_id} not filled within {max_wait_time}s.")
+            await send_telegram_message(f"⚠️ Error: Position order {order_id} not filled within {max_wait_time}s.", account=account)
             return {"success": False, "error": f"Order not filled within {max_wait_time}s"}
 
         # Verify position
         try:
-            positions = check_positions()
+            positions = await run_blocking(check_positions, signer)
             if not positions:
                 logger.error("Position not opened, cannot send TP order.")
-                await send_telegram_message(f"⚠️ Error: Position not opened, TP order not sent.")
+                await send_telegram_message(f"⚠️ Error: Position not opened, TP order not sent.", account=account)
                 return {"success": False, "error": "Position not opened"}
+            entry_price = positions[0]['entry_price'] or expected_price
         except Exception as e:
             logger.error(f"Position check error: {str(e)}")
-            await send_telegram_message(f"⚠️ Error: Position check error: {str(e)}")
+            await send_telegram_message(f"⚠️ Error: Position check error: {str(e)}", account=account)
             return {"success": False, "error": f"Position check error: {str(e)}"}
 
+        if entry_price != expected_price:
+            logger.info(f"{label}Filled at {entry_price:.2f} USDT (expected {expected_price:.2f}), re-basing TP")
+            take_profit_price = entry_price * (1 + TAKE_PROFIT_PCT) if signal == "buy" else entry_price * (1 - TAKE_PROFIT_PCT)
+            take_profit_price = round_to_tick_size(take_profit_price, tick_size)
+
         # Take-profit order
         tp_order_data = {
             "clientOid": str(uuid.uuid4()),
@@ -628,148 +1260,398 @@ async def open_position(signal, usdt_balance):
             st_payload = f"POST/api/v1/st-orders{json.dumps(tp_order_data)}"
             headers = signer.headers(st_payload)
             logger.info(f"TP request: {tp_order_data}")
-            st_response = requests.post(st_url, headers=headers, json=tp_order_data, timeout=10)
-            st_data = st_response.json()
+            st_data = await run_blocking(http_request, "POST", st_url, headers, tp_order_data)
             logger.info(f"TP order response: {st_data}")
 
             if st_data.get('code') == '200000':
                 st_order_id = st_data.get('data', {}).get('orderId')
-                await send_telegram_message(f"✅ TP successfully set: {take_profit_price:.2f}")
-                logger.info(f"TP order successfully set, Order ID: {st_order_id}")
+                await send_telegram_message(f"✅ TP successfully set: {take_profit_price:.2f}", account=account)
+                logger.info(f"{label}TP order successfully set, Order ID: {st_order_id}")
                 # Telegram notification (position opened)
                 await send_telegram_message(
                     f"📈 New Position Opened ({SYMBOL})\n"
                     f"Direction: {'Long' if signal == 'buy' else 'Short'}\n"
-                    f"Entry Price: {eth_price:.2f} USDT\n"
+                    f"Entry Price: {entry_price:.2f} USDT\n"
                     f"Contracts: {size}\n"
                     f"Leverage: {leverage}x\n"
                     f"Position Value: {position_value:.2f} USDT\n"
                     f"Stop Loss: 2% loss check (in loop)\n"
                     f"Take Profit: {take_profit_price:.2f} USDT\n"
-                    f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                    f"Date: {datetime.fromtimestamp(clock_time()).strftime('%Y-%m-%d %H:%M')}",
+                    account=account
                 )
                 return {"success": True, "orderId": order_id, "size": size}
             else:
-                logger.error(f"Failed to set TP: {st_data.get('msg', 'Unknown error')}")
-                await send_telegram_message(f"⚠️ TP order failed: {st_data.get('msg', 'Unknown error')}")
+                logger.error(f"{label}Failed to set TP: {st_data.get('msg', 'Unknown error')}")
+                await send_telegram_message(f"⚠️ TP order failed: {st_data.get('msg', 'Unknown error')}", account=account)
                 return {"success": False, "error": f"TP order failed: {st_data.get('msg', 'Unknown error')}"}
         except Exception as e:
             logger.error(f"TP send error: {str(e)}")
-            await send_telegram_message(f"⚠️ TP order failed: {str(e)}")
+            await send_telegram_message(f"⚠️ TP order failed: {str(e)}", account=account)
             return {"success": False, "error": f"TP send error: {str(e)}"}
     
     except Exception as e:
-        logger.error(f"Open position error: {str(e)}")
-        await send_telegram_message(f"⚠️ Open position error: {str(e)}")
+        logger.error(f"{label}Open position error: {str(e)}")
+        await send_telegram_message(f"⚠️ Open position error: {str(e)}", account=account)
         return {"success": False, "error": str(e)}
 
-async def manage_existing_position(position):
+def position_pnl_pct(position, current_price):
+    entry_price = position['entry_price']
+    if position['side'] == 'long':
+        return (current_price - entry_price) / entry_price * 100
+    return (entry_price - current_price) / entry_price * 100
+
+async def manage_existing_position(position, account=None):
+    # Returns True when the position is gone (closed here or already closed), so the caller refreshes
     try:
-        current_price = get_cached_price()
+        current_price = await run_blocking(get_cached_price)
         if not current_price:
             logger.warning("Price not available, skipping position management.")
-            return
+            return False
 
-        entry_price = position['entry_price']
-        side = position['side']
-        pnl_pct = ((current_price - entry_price) / entry_price * 100) if side == 'long' else ((entry_price - current_price) / entry_price * 100)
-        
-        if pnl_pct <= -2:
-            logger.warning(f"2% loss detected! Closing {SYMBOL} {side} position.")
-            await close_position_with_retry(position)
+        if position_pnl_pct(position, current_price) <= -2:
+            # The position may come from a snapshot up to a minute old (e.g. TP filled since): re-check it
+            signer = account['signer'] if account else get_signer()
+            positions = await run_blocking(check_positions, signer)
+            if positions is None:
+                logger.warning(f"{account_label(account)}Stop triggered but positions unavailable, retrying next tick.")
+                return False
+            if not positions:
+                logger.info(f"{account_label(account)}Stop triggered but position already closed.")
+                return True
+            position = positions[0]
+            if position_pnl_pct(position, current_price) > -2:
+                return False
+            logger.warning(f"{account_label(account)}2% loss detected! Closing {SYMBOL} {position['side']} position.")
+            return await close_position_with_retry(position, account)
+        return False
 
     except Exception as e:
-        logger.error(f"Position management error: {str(e)}")
-        await send_telegram_message(f"⚠️ Position management error: {str(e)}")
+        logger.error(f"{account_label(account)}Position management error: {str(e)}")
+        await send_telegram_message(f"⚠️ Position management error: {str(e)}", account=account)
+        return False
 
-async def main():
-    global last_position
-    notification_cooldown = {
-        'balance_warning': 0,
-        'position_active': False
-    }
-    
-    while True:
+def record_price(price):
+    if not price:
+        return
+    now = clock_time()
+    price_history.append((now, price))
+    while price_history and now - price_history[0][0] > VOLATILITY_WINDOW:
+        price_history.popleft()
+
+def is_volatile():
+    if len(price_history) < 2:
+        return False
+    prices = [price for _, price in price_history]
+    low = min(prices)
+    return (max(prices) - low) / low * 100 >= VOLATILITY_FAST_PCT
+
+def is_idle_low_balance(account):
+    snapshot = account['snapshot']
+    return bool(snapshot) and snapshot['usdt_balance'] < MIN_BALANCE and not snapshot['positions']
+
+def balance_refresh_interval(account):
+    if is_idle_low_balance(account):
+        return LOW_BALANCE_REFRESH_INTERVAL
+    return BALANCE_REFRESH_INTERVAL
+
+def stop_monitor_interval():
+    return STOP_MONITOR_FAST_INTERVAL if is_volatile() else STOP_MONITOR_INTERVAL
+
+def signal_interval():
+    return SIGNAL_FAST_INTERVAL if is_volatile() else SIGNAL_CANDLE_INTERVAL
+
+def load_accounts():
+    # KUCOIN_ACCOUNTS is a JSON list of {"name", "api_key", "api_secret", "api_passphrase"}.
+    # Without it the bot trades the single KUCOIN_API_* account.
+    accounts_json = os.getenv('KUCOIN_ACCOUNTS')
+    if virtual_clock:
+        # Signed calls are served from the tape by account name; a placeholder signer per account is enough
+        configs = [{"name": name, "signer": KcSigner(name, name, name)} for name in session_tape.account_names]
+    elif not accounts_json:
+        configs = [{"name": "main", "signer": get_signer()}]
+    else:
+        configs = [
+            {"name": config['name'], "signer": KcSigner(config['api_key'], config['api_secret'], config['api_passphrase'])}
+            for config in json.loads(accounts_json)
+        ]
+    result = []
+    account_names.clear()
+    for config in configs:
+        account_names[config['signer'].api_key] = config['name']
+        result.append({
+            "name": config['name'],
+            "signer": config['signer'],
+            "snapshot": None,  # Latest complete reconcile_account() result
+            "snapshot_ok": False,  # Whether the latest refresh was complete
+            "last_position": None,  # Track last position
+            "opening": asyncio.Lock(),  # Held by open_account_position() until the TP order is placed
+            "notification_cooldown": {
+                'balance_warning': 0,
+                'position_active': False,
+                'missing_tp': False
+            }
+        })
+    logger.info(f"Loaded {len(result)} account(s): {[account['name'] for account in result]}")
+    return result
+
+async def run_for_accounts(name, target_accounts, func):
+    # One task per account; a failing account is logged and never affects the others.
+    # No overall timeout: cancelling mid-order could leave a filled order without its TP,
+    # and every HTTP call is already bounded by its own request timeout.
+    async def run(account):
         try:
-            # 1. Balance and Position Check
-            usdt_balance, position_margin = check_usdm_balance()
-            positions = check_positions()
-            current_price = get_cached_price()
-            
-            # 2. Critical Condition Checks
-            if usdt_balance < MIN_BALANCE:
-                if not positions:
-                    if time.time() - notification_cooldown['balance_warning'] > 3600:
-                        await send_telegram_message(
-                            f"⚠️ Insufficient Balance: {usdt_balance:.2f} USDT (Min: {MIN_BALANCE} USDT)\n"
-                            f"⏳ Next check: 5 minutes later"
-                        )
-                        notification_cooldown['balance_warning'] = time.time()
-                    await asyncio.sleep(300)
-                    continue
-                else:
-                    logger.warning(f"Position open but low balance: {usdt_balance:.2f} USDT")
+            return await func(account)
+        except Exception as e:
+            logger.error(f"[{account['name']}] {name} error: {str(e)}")
+        return None
+    return await asyncio.gather(*(run(account) for account in target_accounts))
 
-            # 2.2 Active Position Check
-            if positions:
-                if not notification_cooldown['position_active']:
-                    pos = positions[0]
-                    await send_telegram_message(
-                        f"♻️ Open Position Detected:\n"
-                        f"Direction: {pos['side'].upper()}\n"
-                        f"Entry: {pos['entry_price']:.2f}\n"
-                        f"Size: {abs(pos['currentQty'])} contracts\n"
-                        f"Current Price: {current_price:.2f if current_price is not None else 'Unknown'}"
-                    )
-                    notification_cooldown['position_active'] = True
-                
-                await manage_existing_position(positions[0])
-                
-                # Position closure check
-                if last_position and not positions:
-                    fills = check_fills()
-                    if fills:
-                        logger.info(f"Close details: {fills}")
-                        await send_telegram_message(
-                            f"📉 Position Closed!\n"
-                            f"Symbol: {SYMBOL}\n"
-                            f"Direction: {last_position['side'].upper()}\n"
-                            f"Entry: {last_position['entry_price']:.2f} USDT\n"
-                            f"Exit: {fills[0]['price']:.2f} USDT\n"
-                            f"Reason: {fills[0]['reason']}\n"
-                            f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                        )
-                    last_position = None
-                
-                await asyncio.sleep(60)
-                continue
-            else:
-                if notification_cooldown['position_active']:
-                    await send_telegram_message("✅ All positions closed")
-                    notification_cooldown['position_active'] = False
-                last_position = None
-
-            # 3. Normal Trading Flow
-            indicators = calculate_indicators()
-            if not indicators:
-                await asyncio.sleep(60)
-                continue
+class Scheduler:
+    def __init__(self):
+        self.jobs = []
 
-            deepsearch_result = run_deepsearch()
-            signal = get_grok_signal(indicators, deepsearch_result)
-            
-            if signal != "wait":
-                logger.info(f"New signal received: {signal.upper()}")
-                await open_position(signal, usdt_balance)
-            
-            await asyncio.sleep(60)
+    def add_job(self, name, func, interval, align=False, offset=0, run_at_start=True):
+        # interval is seconds or a callable returning seconds, re-read before every sleep.
+        # Aligned jobs run on wall-clock multiples of interval (+ offset), e.g. candle closes.
+        self.jobs.append({
+            "name": name,
+            "func": func,
+            "interval": interval,
+            "align": align,
+            "offset": offset,
+            "run_at_start": run_at_start
+        })
+
+    def next_due(self, job, last_due, now):
+        interval = job['interval']() if callable(job['interval']) else job['interval']
+        if job['align']:
+            return ((now - job['offset']) // interval + 1) * interval + job['offset']
+        # Anchor on the previous due time so tick duration doesn't accumulate as drift
+        return max(last_due + interval, now)
+
+    def start_job(self, job):
+        now = clock_time()
+        job['last_due'] = now
+        job['due'] = now if job['run_at_start'] else self.next_due(job, now, now)
+        job['retrying'] = False
 
+    def recheck_due(self, job, now):
+        if not job['retrying']:
+            # Switch to a shorter cadence (fast mode) without waiting out the old one
+            job['due'] = min(job['due'], self.next_due(job, job['last_due'], now))
+
+    async def execute_job(self, job):
+        job['last_due'] = job['due']
+        retry_delay = None
+        try:
+            await job['func']()
         except requests.exceptions.RequestException as e:
-            logger.error(f"API connection error: {str(e)}")
-            await asyncio.sleep(30)
+            logger.error(f"{job['name']}: API connection error: {str(e)}")
+            retry_delay = API_ERROR_RETRY
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            await asyncio.sleep(10)
+            logger.error(f"{job['name']}: Unexpected error: {str(e)}")
+            retry_delay = UNEXPECTED_ERROR_RETRY
+
+        now = clock_time()
+        job['retrying'] = retry_delay is not None
+        job['due'] = now + retry_delay if job['retrying'] else self.next_due(job, job['last_due'], now)
+        logger.info(f"{job['name']}: next run in {job['due'] - now:.1f}s")
+
+    async def run_job(self, job):
+        self.start_job(job)
+        while True:
+            now = clock_time()
+            while now < job['due']:
+                await asyncio.sleep(min(job['due'] - now, SCHEDULER_RECHECK))
+                now = clock_time()
+                self.recheck_due(job, now)
+            await self.execute_job(job)
+
+    async def run_virtual(self):
+        # Replay: run one job at a time in due order, jumping the virtual clock straight to the next due time
+        for job in self.jobs:
+            self.start_job(job)
+        while True:
+            now = clock_time()
+            for job in self.jobs:
+                self.recheck_due(job, now)
+            job = min(self.jobs, key=lambda job: job['due'])
+            virtual_clock.advance_to(job['due'])
+            await self.execute_job(job)
+
+    async def run(self):
+        if virtual_clock:
+            await self.run_virtual()
+        else:
+            await asyncio.gather(*(self.run_job(job) for job in self.jobs))
+
+async def refresh_account(account):
+    snapshot = await reconcile_account(account)
+    record_price(snapshot['price'])
+    account['snapshot_ok'] = snapshot['ok']
+    if not snapshot['ok']:
+        # Keep the last complete snapshot for stop monitoring, but don't trade on it
+        logger.warning(f"{account_label(account)}Incomplete account snapshot, trading paused until the next refresh")
+        return
+    account['snapshot'] = snapshot
+    usdt_balance = snapshot['usdt_balance']
+    positions = snapshot['positions']
+    current_price = snapshot['price']
+    notification_cooldown = account['notification_cooldown']
+    label = account_label(account)
+
+    if usdt_balance < MIN_BALANCE:
+        if not positions:
+            if clock_time() - notification_cooldown['balance_warning'] > 3600:
+                notification_cooldown['balance_warning'] = clock_time()
+                await send_telegram_message(
+                    f"⚠️ Insufficient Balance: {usdt_balance:.2f} USDT (Min: {MIN_BALANCE} USDT)\n"
+                    f"⏳ Next check: {balance_refresh_interval(account) // 60} minutes later",
+                    account=account
+                )
+        else:
+            logger.warning(f"{label}Position open but low balance: {usdt_balance:.2f} USDT")
+
+    if account['opening'].locked():
+        # open_account_position() may be between the market order and its TP; it refreshes once done
+        logger.info(f"{label}Position opening in progress, skipping position notifications")
+        return
+
+    # Cooldown flags are set before each send, so an overlapping refresh never notifies twice
+    if positions:
+        if not notification_cooldown['position_active']:
+            notification_cooldown['position_active'] = True
+            pos = positions[0]
+            await send_telegram_message(
+                f"♻️ Open Position Detected:\n"
+                f"Direction: {pos['side'].upper()}\n"
+                f"Entry: {pos['entry_price']:.2f}\n"
+                f"Size: {abs(pos['currentQty'])} contracts\n"
+                f"Current Price: {f'{current_price:.2f}' if current_price is not None else 'Unknown'}",
+                account=account
+            )
+        if not snapshot['stop_orders'] and not notification_cooldown['missing_tp']:
+            notification_cooldown['missing_tp'] = True
+            logger.warning(f"{label}Open position has no take-profit order")
+            await send_telegram_message(f"⚠️ Open position has no take-profit order ({SYMBOL})", account=account)
+        account['last_position'] = positions[0]
+        return
+
+    # Position closure check
+    last_position = account['last_position']
+    if last_position:
+        fills = await run_blocking(check_fills, account['signer'])
+        if fills:
+            logger.info(f"{label}Close details: {fills}")
+            await send_telegram_message(
+                f"📉 Position Closed!\n"
+                f"Symbol: {SYMBOL}\n"
+                f"Direction: {last_position['side'].upper()}\n"
+                f"Entry: {last_position['entry_price']:.2f} USDT\n"
+                f"Exit: {fills[0]['price']:.2f} USDT\n"
+                f"Reason: {fills[0]['reason']}\n"
+                f"Date: {datetime.fromtimestamp(clock_time()).strftime('%Y-%m-%d %H:%M')}",
+                account=account
+            )
+    if notification_cooldown['position_active']:
+        notification_cooldown['position_active'] = False
+        await send_telegram_message("✅ All positions closed", account=account)
+    notification_cooldown['missing_tp'] = False
+    account['last_position'] = None
+
+async def refresh_accounts():
+    await run_for_accounts("balance_refresh", accounts, refresh_account)
+
+async def monitor_account_stops(account):
+    snapshot = account['snapshot']
+    if not snapshot or not snapshot['positions']:
+        return
+    record_price(await run_blocking(get_cached_price))
+    if await manage_existing_position(snapshot['positions'][0], account):
+        await refresh_account(account)
+
+async def refresh_sentiment():
+    await run_deepsearch(True)
+
+def is_signal_eligible(account):
+    snapshot = account['snapshot']
+    if not snapshot:
+        return False
+    if not account['snapshot_ok']:
+        logger.info(f"[{account['name']}] Signal evaluation: last account refresh failed, skipping.")
+        return False
+    if snapshot['positions']:
+        logger.info(f"[{account['name']}] Signal evaluation: position open, skipping.")
+        return False
+    if snapshot['usdt_balance'] < MIN_BALANCE:
+        logger.info(f"[{account['name']}] Signal evaluation: insufficient balance, skipping.")
+        return False
+    return True
+
+async def open_account_position(signal, account, plan):
+    async with account['opening']:
+        result = await open_position(signal, account['snapshot']['usdt_balance'], account, plan)
+    await refresh_account(account)
+    return result
+
+async def evaluate_signal():
+    eligible = [account for account in accounts if is_signal_eligible(account)]
+    if not eligible:
+        return
+
+    # Market data, indicators and sentiment are computed once for all accounts
+    indicators = await calculate_indicators()
+    if not indicators:
+        return
+
+    deepsearch_result = last_deepsearch_result or await run_deepsearch()
+    signal = get_grok_signal(indicators, deepsearch_result)
+
+    if signal != "wait":
+        logger.info(f"New signal received: {signal.upper()}, accounts: {[account['name'] for account in eligible]}")
+        plans = await plan_positions(signal, eligible)
+        if not plans:
+            return
+        plan_by_name = {account['name']: plan for account, plan in zip(eligible, plans)}
+        results = await run_for_accounts("open_position", eligible,
+                                         lambda account: open_account_position(signal, account, plan_by_name[account['name']]))
+        for account, result in zip(eligible, results):
+            logger.info(f"[{account['name']}] Open position result: {result}")
+
+async def main():
+    global accounts, orderbook_task, compute_pool
+    start_session_tape()
+    wall_start = time.time()
+    accounts = load_accounts()
+    if session_tape:
+        session_tape.record_accounts([account['name'] for account in accounts])
+    if not virtual_clock:
+        # Replay computes inline and reads the order book from the tape
+        compute_pool = ComputeWorkerPool()
+        orderbook_task = asyncio.create_task(run_orderbook_feed())
+    try:
+        await refresh_accounts()
+
+        scheduler = Scheduler()
+        # Balance refresh and stop monitoring are per account, so a slow close on one account
+        # never delays another account's stop check
+        for account in accounts:
+            scheduler.add_job(f"balance_refresh[{account['name']}]", functools.partial(refresh_account, account),
+                              functools.partial(balance_refresh_interval, account), run_at_start=False)
+            scheduler.add_job(f"stop_monitor[{account['name']}]", functools.partial(monitor_account_stops, account),
+                              stop_monitor_interval)
+        scheduler.add_job("sentiment_refresh", refresh_sentiment, DEEPSEARCH_INTERVAL)
+        scheduler.add_job("signal_evaluation", evaluate_signal, signal_interval, align=True, offset=CANDLE_CLOSE_DELAY)
+        await scheduler.run()
+    except ReplayFinished as e:
+        logger.info(f"End of tape: {e}")
+        report_replay(wall_start)
+    finally:
+        if compute_pool:
+            compute_pool.shutdown()
+        if session_tape:
+            session_tape.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
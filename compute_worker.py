@@ -0,0 +1,49 @@
+import json
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+# Indicator and sentiment math shared by bot.py and its compute worker processes.
+# Workers import this module to run their tasks, so it stays free of clients, env loading and
+# other module-level side effects. Started through run.py, the workers import nothing else.
+
+_worker_analyzer = None  # Per-process VADER analyzer, built by init_worker()
+
+def compute_indicator_values(closes):
+    close = pd.Series(closes)
+    return (
+        ta.rsi(close, length=14).iloc[-1],
+        ta.sma(close, length=200).iloc[-1],
+        ta.ema(close, length=50).iloc[-1],
+        close.iloc[-1]
+    )
+
+def score_sentiment(texts, analyzer=None):
+    analyzer = analyzer or SentimentIntensityAnalyzer()
+    return [analyzer.polarity_scores(text)["compound"] for text in texts]
+
+def init_worker():
+    global _worker_analyzer
+    _worker_analyzer = SentimentIntensityAnalyzer()
+
+def indicator_worker(shm_name, length):
+    # Layout: length closes followed by RSI, MA200, EMA50, PRICE
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        closes = np.ndarray((length,), dtype=np.float64, buffer=shm.buf).copy()
+        np.ndarray((4,), dtype=np.float64, buffer=shm.buf, offset=length * 8)[:] = compute_indicator_values(closes)
+    finally:
+        shm.close()
+
+def sentiment_worker(shm_name, count, payload_size):
+    # Layout: count float64 scores followed by the JSON-encoded texts
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        offset = count * 8
+        texts = json.loads(bytes(shm.buf[offset:offset + payload_size]).decode('utf-8'))
+        np.ndarray((count,), dtype=np.float64, buffer=shm.buf)[:] = score_sentiment(texts, _worker_analyzer)
+    finally:
+        shm.close()
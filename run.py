@@ -0,0 +1,8 @@
+import asyncio
+
+# Entry point for the worker dyno. Spawned compute workers re-run the main script as __mp_main__,
+# so bot (and telegram, websockets, feedparser, ...) is imported only under the guard below:
+# workers load nothing but compute_worker.
+if __name__ == "__main__":
+    import bot
+    asyncio.run(bot.main())